@@ -1,16 +1,32 @@
 import os
 import time
-import json
 import logging
+import hashlib
+import threading
+import concurrent.futures
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from requests_toolbelt import MultipartEncoder
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from google.oauth2 import service_account
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
+from googleapiclient.http import build_http
+from googleapiclient.model import JsonModel
+from cachetools import LRUCache
 from dotenv import load_dotenv
+from tenacity import (
+    retry, retry_if_exception, retry_if_exception_type, stop_after_attempt,
+    wait_exponential, wait_exponential_jitter, before_sleep_log
+)
 import io
 import boto3
+from PIL import Image, ImageOps
+from boto3.s3.transfer import TransferConfig
 from botocore.client import Config
+from botocore.exceptions import ClientError
 
 # Setup Logging
 logging.basicConfig(
@@ -51,6 +67,31 @@ R2_ACCESS_KEY_ID = get_env_var("R2_ACCESS_KEY_ID")
 R2_SECRET_ACCESS_KEY = get_env_var("R2_SECRET_ACCESS_KEY")
 R2_BUCKET_NAME = get_env_var("R2_BUCKET_NAME")
 
+# Large images go up as multipart in 8 MB parts instead of a single PUT. Uploads
+# already run on the shared pool, so boto3 mustn't spin up its own threads per call.
+R2_TRANSFER_CONFIG = TransferConfig(multipart_threshold=8 * 1024 * 1024, use_threads=False)
+
+# Poll timing: the Drive change feed is checked every POLL_INTERVAL seconds,
+# with a full folder listing on startup and every FULL_SCAN_INTERVAL seconds
+POLL_INTERVAL = 10
+FULL_SCAN_INTERVAL = 3600
+
+# Images taken per folder per scan, oldest first; a backlog is drained over
+# back-to-back scans so each cycle stays short
+IMAGE_PAGE_SIZE = 20
+
+# Shared session for Make webhook POSTs: pooled keep-alive connections.
+# Retries live in send_webhook, since a streamed body can't be replayed by urllib3.
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=16))
+
+# Make responses worth retrying (transient gateway errors)
+WEBHOOK_RETRY_STATUSES = (502, 503, 504)
+
+# (connect, read) timeout in seconds for webhook POSTs, so a hung Make endpoint
+# can't block a worker forever
+WEBHOOK_TIMEOUT = (10, 60)
+
 # Default Prompts
 DEFAULT_PROMPT_LINKEDIN = "Write a professional, craftsmanship-focused LinkedIn caption for this image."
 DEFAULT_PROMPT_META = "Write a casual, engaging Facebook/Instagram caption for this image."
@@ -58,22 +99,100 @@ DEFAULT_PROMPT_GBP = "Write an SEO-heavy Google Business Profile caption for thi
 DEFAULT_PROMPT_TWITTER = "Write a punchy tweet under 280 chars for a construction firm. No hashtags."
 DEFAULT_PROMPT_BLUESKY = "Write a casual micro-blog post under 300 chars for a construction firm. No hashtags."
 
-def get_drive_service():
-    """Authenticates and returns the Google Drive API service."""
+SYSTEM_INSTRUCTION = "You are a social media engine. Output ONLY the caption. Do not output conversational filler."
+
+# Longest edge (px) of images sent to Gemini; it tiles at 768px internally anyway
+GEMINI_MAX_IMAGE_EDGE = 1024
+
+GEMINI_MODEL = "gemini-2.0-flash"
+
+# Gemini model, built once in setup_gemini() and shared by every caption call
+_MODEL = None
+
+# Drive query for prompt files, formatted once
+_CONFIG_QUERY = f"'{ID_CONFIG}' in parents and trashed = false and mimeType = 'text/plain'"
+
+# Gemini responses keyed by (sha256 of image, prompt), so reprocessing the same
+# image (retries, duplicates across folders) skips the model call. Failed and
+# unparseable responses raise before caching, so only usable answers are stored.
+_CAPTION_CACHE = LRUCache(maxsize=256)
+_CAPTION_CACHE_LOCK = threading.Lock()
+
+# Prompt file contents by file id: {id: (modifiedTime, content)}
+_PROMPT_CACHE = {}
+
+# Ids of the files in ID_CONFIG as of the last prompt load, so the change feed
+# can spot prompt files that were deleted or moved out of the folder
+_PROMPT_FILE_IDS = set()
+
+# Platforms captioned for each source folder
+SOURCE_TARGETS = {
+    "linkedin": ["linkedin"],
+    "meta": ["meta"],
+    "gbp": ["gbp"],
+    "twitter": ["twitter"],
+    "bluesky": ["bluesky"],
+    "all": ["linkedin", "meta", "gbp", "twitter", "bluesky"]
+}
+
+class OrjsonModel(JsonModel):
+    """JsonModel that parses Drive API responses with orjson instead of json."""
+
+    def deserialize(self, content):
+        try:
+            body = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            return content.decode('utf-8') if isinstance(content, bytes) else content
+        if self._data_wrapper and "data" in body:
+            body = body["data"]
+        return body
+
+def load_drive_credentials():
+    """Parses the service account key once; every Drive service shares the result."""
     try:
-        creds_info = json.loads(GOOGLE_CREDS_JSON_STR)
-        creds = service_account.Credentials.from_service_account_info(
+        creds_info = orjson.loads(GOOGLE_CREDS_JSON_STR)
+        return service_account.Credentials.from_service_account_info(
             creds_info, scopes=['https://www.googleapis.com/auth/drive']
         )
-        service = build('drive', 'v3', credentials=creds)
+    except Exception as e:
+        logger.error(f"Failed to load Google credentials: {e}")
+        return None
+
+_CREDS = load_drive_credentials()
+
+def get_drive_service():
+    """Authenticates and returns the Google Drive API service."""
+    try:
+        if _CREDS is None:
+            raise ValueError("Google credentials are not available")
+        # build_http() keeps googleapiclient's 60s socket timeout and redirect
+        # handling. httplib2.Http is not thread-safe, so every service (one per
+        # worker thread) gets its own.
+        authed_http = AuthorizedHttp(_CREDS, http=build_http())
+        service = build('drive', 'v3', http=authed_http, model=OrjsonModel(), cache_discovery=False)
         return service
     except Exception as e:
         logger.error(f"Failed to initialize Google Drive service: {e}")
         return None
 
+# googleapiclient's Resource is not thread-safe, so each worker builds its own
+_thread_local = threading.local()
+
+def get_thread_drive_service():
+    """Returns the Drive service owned by the calling thread, building it on first use."""
+    service = getattr(_thread_local, "service", None)
+    if service is None:
+        # A failed build isn't cached, so the next call on this thread retries it
+        service = get_drive_service()
+        if service is not None:
+            _thread_local.service = service
+    return service
+
 def setup_gemini():
+    global _MODEL
     if GEMINI_API_KEY:
         genai.configure(api_key=GEMINI_API_KEY)
+        _MODEL = genai.GenerativeModel(GEMINI_MODEL, system_instruction=SYSTEM_INSTRUCTION)
     else:
         logger.error("GEMINI_API_KEY is missing.")
 
@@ -90,41 +209,79 @@ def get_r2_client():
         logger.error(f"Failed to initialize R2 client: {e}")
         return None
 
-def upload_to_r2(client, image_data, file_name, mime_type):
-    """Uploads file to R2 and returns a presigned URL."""
+def get_r2_key(image_data, file_name):
+    # Keying by content hash makes re-uploads idempotent: the same image
+    # always maps to the same object, which we only PUT once.
+    return f"{hashlib.sha256(image_data).hexdigest()[:16]}-{file_name}"
+
+def get_r2_url(client, key):
+    """Returns a presigned URL for an R2 object, valid for 1 hour."""
+    # Signing is local (no network) and doesn't need the object to exist yet,
+    # so this runs before the upload finishes.
     try:
-        logger.info(f"Uploading {file_name} to R2...")
-        client.put_object(
-            Bucket=R2_BUCKET_NAME,
-            Key=file_name,
-            Body=image_data,
-            ContentType=mime_type
-        )
-        # Generate a public URL valid for 1 hour
-        url = client.generate_presigned_url(
+        return client.generate_presigned_url(
             ClientMethod='get_object',
-            Params={'Bucket': R2_BUCKET_NAME, 'Key': file_name},
+            Params={'Bucket': R2_BUCKET_NAME, 'Key': key},
             ExpiresIn=3600
         )
-        return url
     except Exception as e:
-        logger.error(f"R2 Upload failed: {e}")
+        logger.error(f"R2 URL signing failed: {e}")
         return None
 
+def upload_to_r2(client, image_data, key, mime_type):
+    """Uploads file to R2 unless identical content is already there. Returns True on success."""
+    try:
+        try:
+            client.head_object(Bucket=R2_BUCKET_NAME, Key=key)
+            exists = True
+        except ClientError:
+            exists = False
+        
+        if exists:
+            logger.info(f"{key} already in R2, skipping upload.")
+        else:
+            logger.info(f"Uploading {key} to R2...")
+            # BytesIO over the downloaded bytes shares their buffer rather than copying it,
+            # and gives this upload its own read position while Gemini uses the same data.
+            client.upload_fileobj(
+                io.BytesIO(image_data),
+                R2_BUCKET_NAME,
+                key,
+                ExtraArgs={'ContentType': mime_type},
+                Config=R2_TRANSFER_CONFIG
+            )
+        return True
+    except Exception as e:
+        logger.error(f"R2 Upload failed: {e}")
+        return False
+
+def download_file(service, file_id):
+    """Downloads a Drive file's content in a single authorized GET."""
+    # Executing the media request directly returns the whole body, skipping
+    # MediaIoBaseDownload's chunk loop (our prompts and images are small).
+    return service.files().get_media(fileId=file_id).execute()
+
 def get_text_content(service, file_id):
     try:
-        request = service.files().get_media(fileId=file_id)
-        fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while done is False:
-            status, done = downloader.next_chunk()
-        return fh.getvalue().decode('utf-8').strip()
+        return download_file(service, file_id).decode('utf-8').strip()
     except Exception as e:
         logger.warning(f"Failed to read prompt file {file_id}: {e}")
         return None
 
+def get_prompt_content(service, file):
+    """Returns a prompt file's text, downloading it only when its modifiedTime has changed."""
+    file_id = file.get('id')
+    modified_time = file.get('modifiedTime')
+    cached = _PROMPT_CACHE.get(file_id)
+    if cached and cached[0] == modified_time:
+        return cached[1]
+    content = get_text_content(service, file_id)
+    if content is not None:
+        _PROMPT_CACHE[file_id] = (modified_time, content)
+    return content
+
 def get_prompts(service):
+    global _PROMPT_FILE_IDS
     prompts = {
         "linkedin": DEFAULT_PROMPT_LINKEDIN,
         "meta": DEFAULT_PROMPT_META,
@@ -135,58 +292,250 @@ def get_prompts(service):
     if not service or not ID_CONFIG:
         return prompts
     try:
-        query = f"'{ID_CONFIG}' in parents and trashed = false and mimeType = 'text/plain'"
-        results = service.files().list(q=query, fields="files(id, name)").execute()
+        results = service.files().list(q=_CONFIG_QUERY, fields="files(id, name, modifiedTime)").execute()
         files = results.get('files', [])
+        _PROMPT_FILE_IDS = {file.get('id') for file in files}
         for file in files:
             name = file.get('name').lower()
             if name == 'prompt_linkedin.txt':
-                content = get_text_content(service, file.get('id'))
+                content = get_prompt_content(service, file)
                 if content: prompts["linkedin"] = content
             elif name == 'prompt_meta.txt':
-                content = get_text_content(service, file.get('id'))
+                content = get_prompt_content(service, file)
                 if content: prompts["meta"] = content
             elif name == 'prompt_gbp.txt':
-                content = get_text_content(service, file.get('id'))
+                content = get_prompt_content(service, file)
                 if content: prompts["gbp"] = content
             elif name == 'prompt_twitter.txt':
-                content = get_text_content(service, file.get('id'))
+                content = get_prompt_content(service, file)
                 if content: prompts["twitter"] = content
             elif name == 'prompt_bluesky.txt':
-                content = get_text_content(service, file.get('id'))
+                content = get_prompt_content(service, file)
                 if content: prompts["bluesky"] = content
     except Exception as e:
         logger.error(f"Error fetching prompts: {e}")
     return prompts
 
+def prepare_gemini_image(image_data, mime_type):
+    """Downscales an image to GEMINI_MAX_IMAGE_EDGE on its longest side for captioning.
+
+    Returns (data, mime_type); the original is returned unchanged if it is
+    already small enough or can't be decoded.
+    """
+    try:
+        img = Image.open(io.BytesIO(image_data))
+        if max(img.size) <= GEMINI_MAX_IMAGE_EDGE:
+            return image_data, mime_type
+        # Shrink before anything loads the pixels, so JPEGs decode in draft mode at
+        # reduced size. thumbnail keeps the EXIF data, so rotating afterwards still
+        # works (re-encoding would drop the orientation tag).
+        img.thumbnail((GEMINI_MAX_IMAGE_EDGE, GEMINI_MAX_IMAGE_EDGE))
+        img = ImageOps.exif_transpose(img)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        buf = io.BytesIO()
+        img.save(buf, format='JPEG', quality=85, optimize=True)
+        return buf.getvalue(), 'image/jpeg'
+    except Exception as e:
+        logger.warning(f"Could not downscale image for Gemini, sending original: {e}")
+        return image_data, mime_type
+
+_GEMINI_BACKOFF = wait_exponential_jitter(initial=1, max=60)
+
+def gemini_retry_wait(retry_state):
+    """Backs off with jitter, but never for less than the server's RetryInfo delay."""
+    wait = _GEMINI_BACKOFF(retry_state)
+    error = retry_state.outcome.exception()
+    for detail in getattr(error, 'details', None) or []:
+        retry_delay = getattr(detail, 'retry_delay', None)
+        if retry_delay is not None:
+            return max(wait, min(retry_delay.seconds, 60))
+    return wait
+
+@retry(
+    retry=retry_if_exception_type((google_exceptions.ResourceExhausted, google_exceptions.ServiceUnavailable)),
+    wait=gemini_retry_wait,
+    stop=stop_after_attempt(5),
+    before_sleep=before_sleep_log(logger, logging.WARNING),
+    reraise=True
+)
+def gemini_generate(content_parts, generation_config=None):
+    """Runs one Gemini request, retrying 429/503 responses."""
+    response = _MODEL.generate_content(content_parts, generation_config=generation_config)
+    return response.text
+
+def generate_text(image_data, mime_type, prompt, generation_config=None, parse=None):
+    """Returns Gemini's response for an image and prompt, reusing the answer for repeat inputs.
+
+    If parse is given, the response is passed through it and the parsed value is
+    what gets cached and returned; a response that fails to parse isn't cached.
+    """
+    key = (hashlib.sha256(image_data).digest(), prompt)
+    with _CAPTION_CACHE_LOCK:
+        cached = _CAPTION_CACHE.get(key)
+    if cached is not None:
+        return cached
+    content_parts = [{"mime_type": mime_type, "data": image_data}, prompt]
+    result = gemini_generate(content_parts, generation_config=generation_config)
+    if parse:
+        result = parse(result)
+    with _CAPTION_CACHE_LOCK:
+        _CAPTION_CACHE[key] = result
+    return result
+
+def parse_captions(response_text):
+    captions = orjson.loads(response_text)
+    if not isinstance(captions, dict):
+        raise ValueError(f"Expected a JSON object of captions, got {type(captions).__name__}")
+    return captions
+
 def generate_caption(image_data, mime_type, prompt):
     try:
-        model = genai.GenerativeModel(
-            "gemini-2.0-flash",
-            system_instruction="You are a social media engine. Output ONLY the caption. Do not output conversational filler."
-        )
-        content_parts = [{"mime_type": mime_type, "data": image_data}, prompt]
-        response = model.generate_content(content_parts)
-        return response.text.strip()
+        return generate_text(image_data, mime_type, prompt).strip()
     except Exception as e:
         logger.error(f"Gemini generation failed: {e}")
         return ""
 
-def move_file(service, file_id, destination_folder_id):
+def generate_captions(image_data, mime_type, prompts, targets):
+    """Captions one image for every target, in a single Gemini request when there are several."""
+    if len(targets) == 1:
+        return {targets[0]: generate_caption(image_data, mime_type, prompts[targets[0]])}
+    # One request processes the image tokens once instead of once per platform
+    instructions = "\n".join(f"- {target}: {prompts[target]}" for target in targets)
+    prompt = (
+        "Write one caption per platform for this image, following each platform's instructions:\n"
+        f"{instructions}\n"
+        f"Return a JSON object with exactly these keys: {', '.join(targets)}. "
+        "Each value is the caption text only."
+    )
     try:
-        file = service.files().get(fileId=file_id, fields='parents').execute()
-        previous_parents = ",".join(file.get('parents'))
-        service.files().update(
-            fileId=file_id,
-            addParents=destination_folder_id,
-            removeParents=previous_parents,
-            fields='id, parents'
-        ).execute()
-        logger.info(f"Moved file {file_id} to {destination_folder_id}")
+        captions = generate_text(
+            image_data, mime_type, prompt,
+            generation_config={"response_mime_type": "application/json"},
+            parse=parse_captions
+        )
+        return {target: str(captions.get(target, "")).strip() for target in targets}
     except Exception as e:
-        logger.error(f"Failed to move file {file_id}: {e}")
+        logger.error(f"Gemini generation failed: {e}")
+        return {target: "" for target in targets}
+
+def is_transient_webhook_error(error):
+    # Only errors where Make can't have accepted the post are retried. A reset or
+    # read timeout after the body was sent may still have gone through, and a
+    # retry would publish a duplicate.
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code in WEBHOOK_RETRY_STATUSES
+    return isinstance(error, requests.ConnectTimeout)
+
+@retry(
+    retry=retry_if_exception(is_transient_webhook_error),
+    wait=wait_exponential(multiplier=0.5),
+    stop=stop_after_attempt(4),
+    before_sleep=before_sleep_log(logger, logging.WARNING),
+    reraise=True
+)
+def send_webhook(payload, file_name, image_data, mime_type):
+    """Posts the payload and image to Make, streaming the multipart body from the image bytes."""
+    # The encoder is a one-shot stream, so every attempt builds a fresh one
+    encoder = MultipartEncoder(fields={**payload, 'file': (file_name, io.BytesIO(image_data), mime_type)})
+    response = _SESSION.post(
+        MAKE_WEBHOOK_URL,
+        data=encoder,
+        headers={'Content-Type': encoder.content_type},
+        timeout=WEBHOOK_TIMEOUT
+    )
+    response.raise_for_status()
+    return response
+
+def move_file(service, file_id, source_folder_id, destination_folder_id):
+    """Builds the update that moves a file out of the folder it was listed from."""
+    # The source folder is already known, so no parents lookup is needed
+    return service.files().update(
+        fileId=file_id,
+        addParents=destination_folder_id,
+        removeParents=source_folder_id,
+        fields='id, parents'
+    )
+
+def move_files(service, moves):
+    """Applies (file_id, source_folder_id, destination_folder_id) moves in batched requests.
+
+    Returns how many moves succeeded.
+    """
+    moved = 0
+
+    def on_moved(request_id, response, exception):
+        nonlocal moved
+        file_id, _, destination_folder_id = moves[int(request_id)]
+        if exception:
+            logger.error(f"Failed to move file {file_id}: {exception}")
+        else:
+            moved += 1
+            logger.info(f"Moved file {file_id} to {destination_folder_id}")
+
+    # Drive accepts at most 100 calls per batch request
+    for start in range(0, len(moves), 100):
+        try:
+            batch = service.new_batch_http_request(callback=on_moved)
+            for index in range(start, min(start + 100, len(moves))):
+                batch.add(move_file(service, *moves[index]), request_id=str(index))
+            batch.execute()
+        except Exception as e:
+            logger.error(f"Failed to move files: {e}")
+    return moved
+
+def list_images(service, query):
+    """Returns (items, has_more): the oldest IMAGE_PAGE_SIZE images, and whether more are waiting."""
+    results = service.files().list(
+        q=query,
+        fields="nextPageToken, files(id, name, mimeType)",
+        pageSize=IMAGE_PAGE_SIZE,
+        orderBy='createdTime'
+    ).execute()
+    return results.get('files', []), 'nextPageToken' in results
+
+def get_start_page_token(service):
+    return service.changes().getStartPageToken().execute().get('startPageToken')
+
+def list_changed_images(service, page_token, folder_map):
+    """Reads the Drive change feed since page_token.
+
+    Returns (work, config_changed, new_page_token), where work holds
+    (item, folder_id) pairs for new images in the watched folders.
+    """
+    work = []
+    config_changed = False
+    while True:
+        results = service.changes().list(
+            pageToken=page_token,
+            fields="nextPageToken, newStartPageToken, changes(fileId, removed, file(id, name, mimeType, parents, trashed))"
+        ).execute()
+        for change in results.get('changes', []):
+            file = change.get('file') or {}
+            parents = file.get('parents', [])
+            # Checked before skipping trashed/removed changes: a known prompt file that
+            # was deleted, trashed or moved out of ID_CONFIG is a config change too.
+            # Trashed files keep their parents.
+            if change.get('fileId') in _PROMPT_FILE_IDS or (ID_CONFIG and ID_CONFIG in parents):
+                config_changed = True
+            if change.get('removed') or not file or file.get('trashed'):
+                continue
+            if not file.get('mimeType', '').startswith('image/'):
+                continue
+            for parent in parents:
+                if parent in folder_map:
+                    work.append((file, parent))
+                    break
+        if 'newStartPageToken' in results:
+            return work, config_changed, results['newStartPageToken']
+        page_token = results['nextPageToken']
+
+def process_file(service, r2_client, pool, file_info, source_type, prompts):
+    """Captions, hosts and posts one image.
 
-def process_file(service, r2_client, file_info, source_type, prompts):
+    Returns the folder the file should be moved to (ID_PROCESSED on success,
+    ID_ERRORS on failure), or None when that folder isn't configured.
+    """
     file_id = file_info['id']
     file_name = file_info['name']
     mime_type = file_info['mimeType']
@@ -195,71 +544,42 @@ def process_file(service, r2_client, file_info, source_type, prompts):
     
     try:
         # Download Image from Drive
-        request = service.files().get_media(fileId=file_id)
-        fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while done is False:
-            status, done = downloader.next_chunk()
-        image_data = fh.getvalue()
+        image_data = download_file(service, file_id)
         
-        payload = {}
-        
-        # 1. Generate Captions based on Source
-        if source_type == "linkedin":
-            payload["caption_linkedin"] = generate_caption(image_data, mime_type, prompts["linkedin"])
-            payload["target"] = "linkedin"
-            
-        elif source_type == "meta":
-            payload["caption_meta"] = generate_caption(image_data, mime_type, prompts["meta"])
-            payload["target"] = "meta"
-            
-        elif source_type == "gbp":
-            payload["caption_gbp"] = generate_caption(image_data, mime_type, prompts["gbp"])
-            payload["target"] = "gbp"
-            
-        elif source_type == "twitter":
-            payload["caption_twitter"] = generate_caption(image_data, mime_type, prompts["twitter"])
-            payload["target"] = "twitter"
-            
-        elif source_type == "bluesky":
-            payload["caption_bluesky"] = generate_caption(image_data, mime_type, prompts["bluesky"])
-            payload["target"] = "bluesky"
-            
-        elif source_type == "all":
-            # Generate ALL captions
-            payload["caption_linkedin"] = generate_caption(image_data, mime_type, prompts["linkedin"])
-            payload["caption_meta"] = generate_caption(image_data, mime_type, prompts["meta"])
-            payload["caption_gbp"] = generate_caption(image_data, mime_type, prompts["gbp"])
-            payload["caption_twitter"] = generate_caption(image_data, mime_type, prompts["twitter"])
-            payload["caption_bluesky"] = generate_caption(image_data, mime_type, prompts["bluesky"])
-            payload["target"] = "all"
-
+        # 1. Generate Captions based on Source, and
         # 2. Upload to R2 (We upload for everyone now to ensure URLs are available)
+        # These share no data, so they run concurrently on the shared pool.
+        # R2 and Make get the original; Gemini only needs a downscaled copy.
+        image_url = None
+        upload_future = None
         if r2_client:
-            public_url = upload_to_r2(r2_client, image_data, file_name, mime_type)
-            if public_url:
-                payload["image_url"] = public_url
+            r2_key = get_r2_key(image_data, file_name)
+            image_url = get_r2_url(r2_client, r2_key)
+            upload_future = pool.submit(upload_to_r2, r2_client, image_data, r2_key, mime_type)
+        gemini_data, gemini_mime_type = prepare_gemini_image(image_data, mime_type)
+        captions_future = pool.submit(
+            generate_captions, gemini_data, gemini_mime_type, prompts, SOURCE_TARGETS[source_type]
+        )
         
-        # 3. Send Webhook
-        files = {
-            'file': (file_name, image_data, mime_type)
-        }
+        payload = {"target": source_type}
+        for target, caption in captions_future.result().items():
+            payload[f"caption_{target}"] = caption
         
+        if upload_future and upload_future.result() and image_url:
+            payload["image_url"] = image_url
+        
+        # 3. Send Webhook
         logger.info(f"Sending webhook for {file_name}...")
-        response = requests.post(MAKE_WEBHOOK_URL, data=payload, files=files)
-        response.raise_for_status()
+        response = send_webhook(payload, file_name, image_data, mime_type)
         
         logger.info(f"Webhook success: {response.status_code}")
         
-        # 4. Move to Processed
-        if ID_PROCESSED:
-            move_file(service, file_id, ID_PROCESSED)
+        # 4. Move to Processed (batched by the caller as files finish)
+        return ID_PROCESSED
             
     except Exception as e:
         logger.error(f"Error processing file {file_name}: {e}")
-        if ID_ERRORS:
-            move_file(service, file_id, ID_ERRORS)
+        return ID_ERRORS
 
 def main():
     logger.info("Starting Kolmo Social Engine...")
@@ -274,6 +594,12 @@ def main():
     if not r2_client:
         logger.warning("Could not initialize R2 Client.")
 
+    # Long-lived pools, reused every cycle: file_pool runs process_file (its threads
+    # keep their Drive services between cycles), pool runs the per-file Gemini
+    # calls and R2 uploads. They must stay separate, since file_pool tasks wait on pool.
+    file_pool = concurrent.futures.ThreadPoolExecutor(max_workers=16)
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=32)
+
     folder_map = {
         ID_LINKEDIN: "linkedin",
         ID_META: "meta",
@@ -283,30 +609,90 @@ def main():
         ID_ALL: "all"
     }
 
+    # Image queries for each configured folder, formatted once
+    # (folders that aren't configured in ENV are skipped)
+    image_queries = {
+        folder_id: f"'{folder_id}' in parents and trashed = false and mimeType contains 'image/'"
+        for folder_id in folder_map if folder_id
+    }
+
+    page_token = None
+    last_full_scan = 0
+    backlog = False
+    current_prompts = None
+
     while True:
         try:
             logger.info("Starting poll cycle...")
-            current_prompts = get_prompts(service)
             
-            for folder_id, source_type in folder_map.items():
-                # Skip folders that aren't configured in ENV
-                if not folder_id: 
-                    continue
+            scan_due = page_token is None or time.time() - last_full_scan >= FULL_SCAN_INTERVAL
+            if scan_due or backlog:
+                # Full listing on startup and periodically as a safety net (e.g. for
+                # files whose move failed), and repeated while a backlog drains; the
+                # change feed covers everything between.
+                # The token is taken first so nothing added during the scan is missed.
+                new_page_token = get_start_page_token(service)
+                current_prompts = get_prompts(service)
                 
-                query = f"'{folder_id}' in parents and trashed = false and mimeType contains 'image/'"
-                results = service.files().list(q=query, fields="files(id, name, mimeType)").execute()
-                items = results.get('files', [])
+                work = []
+                backlog = False
+                for folder_id, query in image_queries.items():
+                    items, has_more = list_images(service, query)
+                    backlog = backlog or has_more
+                    if items:
+                        logger.info(f"Found {len(items)} images in {folder_map[folder_id]} folder.")
+                        work.extend((item, folder_id) for item in items)
+                if scan_due:
+                    last_full_scan = time.time()
+            else:
+                work, config_changed, new_page_token = list_changed_images(service, page_token, folder_map)
+                if config_changed:
+                    logger.info("Prompt files changed. Reloading prompts...")
+                    current_prompts = get_prompts(service)
+                if work:
+                    logger.info(f"Found {len(work)} new images.")
+            page_token = new_page_token
+            
+            moved = 0
+            if work:
+                def run(item, folder_id):
+                    worker_service = get_thread_drive_service()
+                    if worker_service is None:
+                        # Leave the file where it is; a later cycle retries it
+                        logger.error(f"No Drive service for {item['name']}, skipping this cycle.")
+                        return None
+                    return process_file(worker_service, r2_client, pool, item, folder_map[folder_id], current_prompts)
                 
-                if items:
-                    logger.info(f"Found {len(items)} images in {source_type} folder.")
-                    for item in items:
-                        process_file(service, r2_client, item, source_type, current_prompts)
+                futures = {file_pool.submit(run, item, folder_id): (item, folder_id) for item, folder_id in work}
+                # Move files as they finish, batching whatever completed together, so a
+                # crash mid-cycle leaves as few already-posted files behind as possible
+                pending = set(futures)
+                while pending:
+                    done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    done_moves = [
+                        (futures[future][0]['id'], futures[future][1], future.result())
+                        for future in done
+                        if future.result()
+                    ]
+                    moved += move_files(service, done_moves)
             
-            logger.info("Cycle complete. Sleeping for 60s...")
-            time.sleep(60)
+            # Rescan straight away only if files actually left the folders. If a
+            # backlog pass moved nothing, the same files would just be re-posted, so
+            # drop back to the change feed and leave them to the hourly scan.
+            if backlog:
+                if moved > 0:
+                    logger.info("Cycle complete. More images waiting, rescanning now...")
+                    continue
+                logger.warning("Backlog pass moved no files. Waiting for the next full scan.")
+                backlog = False
+            
+            logger.info(f"Cycle complete. Sleeping for {POLL_INTERVAL}s...")
+            time.sleep(POLL_INTERVAL)
             
         except KeyboardInterrupt:
             logger.info("Stopping...")
+            file_pool.shutdown(wait=False)
+            pool.shutdown(wait=False)
             break
         except Exception as e:
             logger.error(f"Unexpected error in main loop: {e}")